@@ -0,0 +1,129 @@
+import itertools
+import json
+
+import pytest
+
+import workout_ai
+from workout_ai import (
+    FitnessGoal, FitnessLevel, MuscleGroup, PlanLibrary, UserProfile,
+    WorkoutGenerationSystem, _EQUIPMENT_VOCAB, _build_class, _calorie_bucket,
+    _canonical_equipment, _class_profile, _encode_plans, _profile_key,
+    build_plan_library,
+)
+
+CLASSES = [(FitnessGoal.STRENGTH, 2, ["dumbbells"], 0),
+           (FitnessGoal.ENDURANCE, 4, [], 2000)]
+
+
+@pytest.fixture(scope="module")
+def library_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("library") / "plan_library.bin")
+    build_plan_library(path, top_k=2, classes=CLASSES)
+    return path
+
+
+def test_calorie_bucket_boundaries():
+    assert _calorie_bucket(None) == 0
+    assert _calorie_bucket(999.9) is None
+    assert _calorie_bucket(1000) == 1000
+    assert _calorie_bucket(1249) == 1000
+    assert _calorie_bucket(1250) == 1500
+    assert _calorie_bucket(20000) == 20000
+    assert _calorie_bucket(20000.1) is None
+
+
+def test_canonical_equipment_keeps_valid_exercises():
+    system = WorkoutGenerationSystem()
+    vocab = _EQUIPMENT_VOCAB + ["kettlebell"]
+    for size in range(len(vocab) + 1):
+        for subset in itertools.combinations(vocab, size):
+            canonical = _canonical_equipment(list(subset))
+            for mg in MuscleGroup:
+                assert (system._get_valid_exercises(mg, list(subset))
+                        == system._get_valid_exercises(mg, canonical))
+
+
+def test_profile_key_days():
+    def key(days):
+        return _profile_key(UserProfile(FitnessLevel.BEGINNER, FitnessGoal.STRENGTH, days, [], None))
+
+    assert key(3.0) == key(3) is not None
+    assert key(3.5) is None
+    assert key("3") is None
+    assert key(8) is None
+
+
+def test_library_round_trip(library_path):
+    library = PlanLibrary.open(library_path)
+    assert library is not None
+    try:
+        for goal, days, equipment, bucket in CLASSES:
+            _, payload = _build_class((goal, days, equipment, bucket, 2))
+            profile = _class_profile(goal, days, equipment, bucket)
+            assert _encode_plans(library.plans(profile)) == payload
+            assert len(library.lookup(profile).days) == days
+    finally:
+        library.close()
+
+
+@pytest.mark.parametrize("top_k", [0, 256])
+def test_build_rejects_bad_top_k(tmp_path, top_k):
+    path = str(tmp_path / "plan_library.bin")
+    with pytest.raises(ValueError):
+        build_plan_library(path, top_k=top_k, classes=CLASSES[:1])
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_open_rejects_short_file(tmp_path):
+    path = tmp_path / "plan_library.bin"
+    path.write_bytes(b"WPLIB")
+    assert PlanLibrary.open(str(path)) is None
+
+
+class FakeCollection:
+    def __init__(self, doc):
+        self.doc = doc
+
+    def find_one(self, query):
+        return self.doc
+
+    def update_one(self, query, update):
+        pass
+
+
+def run_main(monkeypatch, capsys, library_path, days, live_allowed):
+    doc = {"fitnessLevel": "beginner", "goal": "strength",
+           "availableDays": days, "equipment": ["Dumbbells"]}
+    monkeypatch.setattr(workout_ai, "MongoClient",
+                        lambda uri: {"workoutdb": {"userprofiles": FakeCollection(doc)}})
+    monkeypatch.setattr(workout_ai, "LIBRARY_PATH", library_path)
+    calls = []
+    generate = WorkoutGenerationSystem.generate_workout_plan
+
+    def tracked(self, user_profile):
+        calls.append(user_profile)
+        assert live_allowed
+        return generate(self, user_profile)
+
+    monkeypatch.setattr(WorkoutGenerationSystem, "generate_workout_plan", tracked)
+    workout_ai.main("0123456789abcdef01234567")
+    result = json.loads(capsys.readouterr().out)
+    assert result["status"] == "success", result["error"]
+    assert len(result["data"]["weekly_plan"]) == int(days)
+    return calls
+
+
+def test_main_serves_hit_from_library(monkeypatch, capsys, library_path):
+    assert run_main(monkeypatch, capsys, library_path, 2.0, live_allowed=False) == []
+
+
+def test_main_falls_back_on_miss(monkeypatch, capsys, library_path):
+    assert len(run_main(monkeypatch, capsys, library_path, 3, live_allowed=True)) == 1
+
+
+def test_main_falls_back_on_corrupt_library(monkeypatch, capsys, library_path, tmp_path):
+    with open(library_path, "rb") as f:
+        data = f.read()
+    corrupt = tmp_path / "plan_library.bin"
+    corrupt.write_bytes(data[:workout_ai._HEADER.size + 20])
+    assert len(run_main(monkeypatch, capsys, str(corrupt), 2, live_allowed=True)) == 1
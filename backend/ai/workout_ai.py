@@ -1,7 +1,12 @@
 import json
 import random
+import hashlib
+import itertools
+import mmap
+import os
+import struct
 from enum import Enum
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
 from datetime import datetime
 from pymongo import MongoClient
 from bson.objectid import ObjectId
@@ -49,6 +54,18 @@ class Exercise:
         self.secondary_muscles = secondary_muscles if secondary_muscles else []
         self.calorie_burn_rate = calorie_burn_rate  # Base MET value
 
+# Work parameters per goal: rep and set ranges (inclusive) for strength work,
+# rest between sets, and cardio duration. Kept in one place so the precomputed
+# plan library can be versioned against them.
+WORK_PARAMETERS = {
+    FitnessGoal.STRENGTH: {"reps": (4, 6), "sets": (2, 4), "rest_seconds": 150,
+                           "cardio_minutes": 20},     # HIIT style
+    FitnessGoal.HYPERTROPHY: {"reps": (8, 12), "sets": (2, 3), "rest_seconds": 90,
+                              "cardio_minutes": 30},  # Moderate
+    FitnessGoal.ENDURANCE: {"reps": (15, 20), "sets": (2, 2), "rest_seconds": 45,
+                            "cardio_minutes": 45},    # Long steady
+}
+
 class ExerciseSession:
     def __init__(self, exercise: Exercise, goal: FitnessGoal):
         self.exercise = exercise
@@ -57,39 +74,20 @@ class ExerciseSession:
         self.calories = self._calculate_calories()
 
     def _assign_work_parameters(self) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+        params = WORK_PARAMETERS[self.goal]
         if self.exercise.primary_muscle == MuscleGroup.CARDIO:
-            reps, sets = None, None
-            if self.goal == FitnessGoal.STRENGTH:
-                duration = 20  # HIIT style
-            elif self.goal == FitnessGoal.HYPERTROPHY:
-                duration = 30  # Moderate
-            else:  # ENDURANCE
-                duration = 45  # Long steady
-            return reps, sets, duration
+            return None, None, params["cardio_minutes"]
         else:
-            duration = None
-            if self.goal == FitnessGoal.STRENGTH:
-                reps = random.randint(4, 6)
-                sets = random.randint(2, 4)  # Limit sets to a maximum of 4
-            elif self.goal == FitnessGoal.HYPERTROPHY:
-                reps = random.randint(8, 12)
-                sets = random.randint(2, 3)  # Limit sets to a maximum of 3
-            else:  # ENDURANCE
-                reps = random.randint(15, 20)
-                sets = 2  # Fixed sets for endurance
-            return reps, sets, duration
+            reps = random.randint(*params["reps"])
+            sets = random.randint(*params["sets"])
+            return reps, sets, None
 
     def _calculate_calories(self) -> float:
         if self.exercise.primary_muscle == MuscleGroup.CARDIO:
             return self.duration * self.exercise.calorie_burn_rate
         else:
             # Calculate time-based calories for strength training
-            if self.goal == FitnessGoal.STRENGTH:
-                rest = 150  # 2.5 mins
-            elif self.goal == FitnessGoal.HYPERTROPHY:
-                rest = 90   # 1.5 mins
-            else:           # ENDURANCE
-                rest = 45   # 0.75 mins
+            rest = WORK_PARAMETERS[self.goal]["rest_seconds"]
             total_time = (self.reps * 5 + rest) * self.sets / 60.0
             return total_time * self.exercise.calorie_burn_rate
 
@@ -189,6 +187,21 @@ EXERCISE_DB = [
 # WORKOUT GENERATION SYSTEM (GENETIC ALGORITHM)
 # =============================================================================
 
+# Penalties and bonuses used by the fitness function. Kept in one place so the
+# precomputed plan library can be versioned against them.
+FITNESS_WEIGHTS = {
+    "missing_equipment": 50,   # per exercise piece the user doesn't own
+    "consecutive_day": 15,     # same muscle trained on back-to-back days
+    "cardio_bonus": 30,
+    "no_cardio": 100,
+    "missing_exercise": 10,    # per exercise below 8 in a day
+    "full_day_bonus": 20,
+    "calorie_tolerance": 0.2,  # deviation above this is penalized
+    "calorie_deviation": 100,
+    "calorie_close": 0.1,      # deviation below this is rewarded
+    "calorie_bonus": 50,
+}
+
 class WorkoutGenerationSystem:
     def __init__(self):
         self.population_size = 50
@@ -348,13 +361,12 @@ class WorkoutGenerationSystem:
                 target_daily_calories = user_profile.session_duration / num_days
                 while day.total_calories() < target_daily_calories * 0.8:  # 80% of target
                     # Instead of adding new exercises, increase sets of existing ones
-                    if day.sessions:
-                        session_to_boost = random.choice(day.sessions)
-                        if session_to_boost.sets:  # Only for non-cardio exercises
-                            session_to_boost.sets += 1
-                            session_to_boost.calories = session_to_boost._calculate_calories()
-                    else:
-                        break
+                    boostable = [s for s in day.sessions if s.sets]  # Only non-cardio exercises
+                    if not boostable:
+                        break  # e.g. a cardio-only day can't be boosted
+                    session_to_boost = random.choice(boostable)
+                    session_to_boost.sets += 1
+                    session_to_boost.calories = session_to_boost._calculate_calories()
             
             days.append(day)
         
@@ -456,6 +468,7 @@ class WorkoutGenerationSystem:
             plan.days[day_idx].add_session(session)
 
     def _fitness_function(self, plan: WorkoutPlan, user_profile: UserProfile) -> float:
+        w = FITNESS_WEIGHTS
         score = 0
         
         # 1. Equipment compatibility - heavily penalize incompatible equipment
@@ -463,7 +476,7 @@ class WorkoutGenerationSystem:
             for session in day.sessions:
                 for eq in session.exercise.equipment:
                     if eq and eq not in user_profile.equipment:
-                        score -= 50
+                        score -= w["missing_equipment"]
         
         # 2. Recovery spacing
         muscle_occurrences = plan.get_occurrences_by_muscle()
@@ -471,29 +484,29 @@ class WorkoutGenerationSystem:
             days.sort()
             for i in range(1, len(days)):
                 if days[i] - days[i-1] == 1:
-                    score -= 15
+                    score -= w["consecutive_day"]
         
         # 3. Cardio inclusion
         if self._has_cardio(plan):
-            score += 30
+            score += w["cardio_bonus"]
         else:
-            score -= 100
+            score -= w["no_cardio"]
         
         # 4. Minimum exercises per day
         for day in plan.days:
             if len(day.sessions) < 8:
-                score -= (8 - len(day.sessions)) * 10
+                score -= (8 - len(day.sessions)) * w["missing_exercise"]
             else:
-                score += 20
+                score += w["full_day_bonus"]
         
         # 5. Calorie goal alignment
         if user_profile.session_duration:
             total_cals = plan.total_calories()
             deviation = abs(total_cals - user_profile.session_duration) / user_profile.session_duration
-            if deviation > 0.2:
-                score -= 100 * deviation
-            elif deviation < 0.1:
-                score += 50
+            if deviation > w["calorie_tolerance"]:
+                score -= w["calorie_deviation"] * deviation
+            elif deviation < w["calorie_close"]:
+                score += w["calorie_bonus"]
         
         return score
 
@@ -574,6 +587,305 @@ class CustomEncoder(json.JSONEncoder):
             return obj.value
         return super().default(obj)
 
+# =============================================================================
+# PRECOMPUTED PLAN LIBRARY
+# =============================================================================
+#
+# The profile space the generator sees is small: goal x days x the equipment
+# combinations that unlock distinct catalog exercises x a bucketed calorie
+# target. build_plan_library() evolves K independent plans for every class
+# offline and writes them best first to a flat file; PlanLibrary memory-maps it
+# and answers lookups with a binary search, so main() only evolves live on a
+# miss. Calorie-target classes are only built on request: main() currently
+# reads `sessionDuration`, which profiles don't store, so every live request
+# falls in the no-target bucket.
+#
+# File layout (little endian):
+#   header   8s magic | 16s version | I top_k | I class count
+#   index    count x (Q class key | I payload offset | I payload length),
+#            sorted by class key
+#   payload  per class: B plan count, then per plan: B day count, then per
+#            day: B session count + sessions of
+#            (B catalog index | B reps | H sets | H duration), 0 meaning None
+
+LIBRARY_PATH = os.environ.get(
+    "WORKOUT_PLAN_LIBRARY",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "plan_library.bin")
+)
+LIBRARY_TOP_K = 5
+LIBRARY_DAYS = range(1, 8)
+CALORIE_BUCKET = 500
+CALORIE_RANGE = (1000, 20000)  # matches the limits of the profile form
+
+# Bump the magic whenever _class_key or the payload encoding changes
+_LIBRARY_MAGIC = b"WPLIB002"
+_HEADER = struct.Struct("<8s16sII")
+_INDEX_ENTRY = struct.Struct("<QII")
+_SESSION = struct.Struct("<BBHH")
+_EQUIPMENT_VOCAB = sorted({eq for e in EXERCISE_DB for eq in e.equipment if eq})
+_GOALS = list(FitnessGoal)
+
+def library_version() -> str:
+    """Hash of everything a library depends on: catalog, weights, generator and layout."""
+    catalog = [
+        [e.name, e.equipment, e.primary_muscle.value,
+         [mg.value for mg in e.secondary_muscles], e.calorie_burn_rate]
+        for e in EXERCISE_DB
+    ]
+    layout = {
+        "magic": _LIBRARY_MAGIC.decode("ascii"),
+        "days": list(LIBRARY_DAYS),
+        "calorie_bucket": CALORIE_BUCKET,
+        "calorie_range": list(CALORIE_RANGE),
+        "equipment": _EQUIPMENT_VOCAB,
+        "goals": [g.value for g in _GOALS],
+        "index": _INDEX_ENTRY.format,
+        "session": _SESSION.format,
+    }
+    system = WorkoutGenerationSystem()
+    generator = {
+        "settings": vars(system),
+        "splits": {days: [[mg.value for mg in day] for day in system._get_muscle_group_split(days)]
+                   for days in LIBRARY_DAYS},
+        "work": {goal.value: params for goal, params in WORK_PARAMETERS.items()},
+    }
+    blob = json.dumps({
+        "catalog": catalog,
+        "weights": FITNESS_WEIGHTS,
+        "generator": generator,
+        "layout": layout,
+    }, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+def _canonical_equipment(equipment: List[str]) -> List[str]:
+    """Reduce equipment to the pieces that unlock at least one catalog exercise.
+
+    Profiles with the same canonical equipment see the same valid exercises and
+    the same equipment penalties, so they evolve identically.
+    """
+    owned = set(equipment)
+    unlocked = set()
+    for exercise in EXERCISE_DB:
+        if exercise.equipment and all(eq in owned for eq in exercise.equipment):
+            unlocked.update(exercise.equipment)
+    return sorted(unlocked)
+
+def _calorie_bucket(target: Optional[float]) -> Optional[int]:
+    """Round a calorie target to its bucket; 0 means no target, None means out of range."""
+    if not target:
+        return 0
+    if not CALORIE_RANGE[0] <= target <= CALORIE_RANGE[1]:
+        return None
+    return int(target / CALORIE_BUCKET + 0.5) * CALORIE_BUCKET
+
+def _class_key(goal: FitnessGoal, days: int, equipment: List[str],
+               calorie_bucket: int) -> int:
+    mask = 0
+    for eq in equipment:
+        mask |= 1 << _EQUIPMENT_VOCAB.index(eq)
+    return (((_GOALS.index(goal) << 8 | days) << 16 | mask) << 16) | (calorie_bucket // CALORIE_BUCKET)
+
+def _profile_key(user_profile: UserProfile) -> Optional[int]:
+    """Class key for a profile, or None if the library cannot cover it."""
+    days = user_profile.available_days
+    if isinstance(days, float) and days.is_integer():
+        days = int(days)
+    if not isinstance(days, int) or days not in LIBRARY_DAYS:
+        return None
+    bucket = _calorie_bucket(user_profile.session_duration)
+    if bucket is None:
+        return None
+    equipment = _canonical_equipment(user_profile.equipment)
+    return _class_key(user_profile.goal, days, equipment, bucket)
+
+def _equipment_classes() -> List[List[str]]:
+    classes = set()
+    for size in range(len(_EQUIPMENT_VOCAB) + 1):
+        for subset in itertools.combinations(_EQUIPMENT_VOCAB, size):
+            classes.add(tuple(_canonical_equipment(list(subset))))
+    return [list(c) for c in sorted(classes)]
+
+def _library_classes(calorie_targets: bool = False) -> Iterator[Tuple[FitnessGoal, int, List[str], int]]:
+    buckets = [0]
+    if calorie_targets:
+        buckets += list(range(CALORIE_RANGE[0], CALORIE_RANGE[1] + 1, CALORIE_BUCKET))
+    for goal in _GOALS:
+        for days in LIBRARY_DAYS:
+            for equipment in _equipment_classes():
+                for bucket in buckets:
+                    yield goal, days, equipment, bucket
+
+def _encode_plans(plans: List[WorkoutPlan]) -> bytes:
+    catalog_index = {e.name: i for i, e in enumerate(EXERCISE_DB)}
+    out = bytearray([len(plans)])
+    for plan in plans:
+        out.append(len(plan.days))
+        for day in plan.days:
+            out.append(len(day.sessions))
+            for s in day.sessions:
+                out += _SESSION.pack(catalog_index[s.exercise.name], s.reps or 0,
+                                     s.sets or 0, s.duration or 0)
+    return bytes(out)
+
+def _decode_plan(buf, offset: int, goal: FitnessGoal, choice: int) -> WorkoutPlan:
+    """Rebuild the choice-th plan of a class payload starting at offset."""
+    pos = offset + 1
+    for i in range(choice + 1):
+        num_days = buf[pos]
+        pos += 1
+        days = []
+        for day_number in range(1, num_days + 1):
+            num_sessions = buf[pos]
+            pos += 1
+            if i == choice:
+                day = WorkoutDay(day_number)
+                for j in range(num_sessions):
+                    idx, reps, sets, duration = _SESSION.unpack_from(buf, pos + j * _SESSION.size)
+                    session = ExerciseSession(EXERCISE_DB[idx], goal)
+                    session.reps = reps or None
+                    session.sets = sets or None
+                    session.duration = duration or None
+                    session.calories = session._calculate_calories()
+                    day.add_session(session)
+                days.append(day)
+            pos += num_sessions * _SESSION.size
+    return WorkoutPlan(days)
+
+def _class_profile(goal: FitnessGoal, days: int, equipment: List[str],
+                   bucket: int) -> UserProfile:
+    # Fitness level does not influence generation, so one level stands for all three
+    return UserProfile(FitnessLevel.BEGINNER, goal, days, equipment, bucket or None)
+
+def _build_class(job: Tuple[FitnessGoal, int, List[str], int, int]) -> Tuple[int, bytes]:
+    goal, days, equipment, bucket, top_k = job
+    key = _class_key(goal, days, equipment, bucket)
+    random.seed(key)  # reproducible builds
+    profile = _class_profile(goal, days, equipment, bucket)
+    system = WorkoutGenerationSystem()
+    plans = [system.generate_workout_plan(profile) for _ in range(top_k)]
+    plans.sort(key=lambda p: system._fitness_function(p, profile), reverse=True)
+    return key, _encode_plans(plans)
+
+def build_plan_library(path: Optional[str] = None, top_k: int = LIBRARY_TOP_K,
+                       jobs: int = 1, calorie_targets: bool = False,
+                       classes: Optional[List[Tuple[FitnessGoal, int, List[str], int]]] = None) -> int:
+    """Evolve K independent plans for every profile class and write them to path.
+
+    Plans are stored best first. Calorie-target classes are skipped unless
+    calorie_targets is set; classes overrides the enumeration entirely.
+    Returns the number of classes written.
+    """
+    from multiprocessing import Pool
+
+    if not 1 <= top_k <= 255:
+        raise ValueError(f"top_k must be between 1 and 255, got {top_k}")
+    path = path or LIBRARY_PATH
+    if classes is None:
+        classes = list(_library_classes(calorie_targets))
+    work = [(goal, days, equipment, bucket, top_k)
+            for goal, days, equipment, bucket in classes]
+    index = []
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_LIBRARY_MAGIC, library_version().encode("ascii"), top_k, len(work)))
+            f.write(b"\0" * (_INDEX_ENTRY.size * len(work)))
+            offset = f.tell()
+
+            pool = Pool(jobs) if jobs > 1 else None
+            results = pool.imap_unordered(_build_class, work) if pool else map(_build_class, work)
+            try:
+                for n, (key, payload) in enumerate(results, 1):
+                    f.write(payload)
+                    index.append((key, offset, len(payload)))
+                    offset += len(payload)
+                    if n % 100 == 0 or n == len(work):
+                        print(f"built {n}/{len(work)} classes", file=sys.stderr)
+            finally:
+                if pool:
+                    pool.close()
+                    pool.join()
+
+            f.seek(_HEADER.size)
+            for entry in sorted(index):
+                f.write(_INDEX_ENTRY.pack(*entry))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(index)
+
+class PlanLibrary:
+    """Read-only, memory-mapped view of a library written by build_plan_library()."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.top_k, self._count = _HEADER.unpack_from(self._buf, 0)
+        except struct.error:
+            self.close()
+            raise
+        if magic != _LIBRARY_MAGIC:
+            self.close()
+            raise ValueError(f"Not a plan library: {path}")
+        self.version = version.decode("ascii")
+
+    @classmethod
+    def open(cls, path: Optional[str] = None) -> Optional["PlanLibrary"]:
+        """Open the library if it exists and matches the current version."""
+        try:
+            library = cls(path or LIBRARY_PATH)
+        except (OSError, ValueError, struct.error):
+            return None
+        if library.version != library_version():
+            library.close()
+            return None
+        return library
+
+    def close(self):
+        self._buf.close()
+
+    def _find(self, key: int) -> Optional[int]:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry_key, offset, _ = _INDEX_ENTRY.unpack_from(
+                self._buf, _HEADER.size + mid * _INDEX_ENTRY.size)
+            if entry_key < key:
+                lo = mid + 1
+            elif entry_key > key:
+                hi = mid
+            else:
+                return offset
+        return None
+
+    def lookup(self, user_profile: UserProfile) -> Optional[WorkoutPlan]:
+        """Return one of the precomputed plans for this profile, or None on a miss.
+
+        Plans are stored best first and picked with weights K, K-1, ..., 1, so
+        stronger plans are served more often while repeat requests still vary.
+        """
+        key = _profile_key(user_profile)
+        if key is None:
+            return None
+        offset = self._find(key)
+        if offset is None:
+            return None
+        count = self._buf[offset]
+        choice = random.choices(range(count), weights=range(count, 0, -1))[0]
+        return _decode_plan(self._buf, offset, user_profile.goal, choice)
+
+    def plans(self, user_profile: UserProfile) -> List[WorkoutPlan]:
+        """Return every stored plan for this profile, best first."""
+        key = _profile_key(user_profile)
+        offset = self._find(key) if key is not None else None
+        if offset is None:
+            return []
+        return [_decode_plan(self._buf, offset, user_profile.goal, i)
+                for i in range(self._buf[offset])]
+
 # =============================================================================
 # MAIN FUNCTION TO INTERACT WITH DATABASE
 # =============================================================================
@@ -632,8 +944,19 @@ def main(user_id: str):
             sys.stdout.flush()
             return
 
-        system = WorkoutGenerationSystem()
-        plan = system.generate_workout_plan(user_profile)
+        # Serve from the precomputed library when possible, evolve live otherwise
+        plan = None
+        library = PlanLibrary.open()
+        if library is not None:
+            try:
+                plan = library.lookup(user_profile)
+            except Exception:
+                plan = None  # corrupt library or unexpected profile values
+            finally:
+                library.close()
+        if plan is None:
+            system = WorkoutGenerationSystem()
+            plan = system.generate_workout_plan(user_profile)
 
         serialized_plan = serialize_workout_plan(plan)
 
@@ -652,6 +975,25 @@ def main(user_id: str):
 
 if __name__ == "__main__":
     import sys
+    if len(sys.argv) >= 2 and sys.argv[1] == "--build-library":
+        import argparse
+        parser = argparse.ArgumentParser(prog="workout_ai.py --build-library",
+                                         description="Precompute the workout plan library.")
+        parser.add_argument("--output", default=LIBRARY_PATH)
+        def top_k_arg(value: str) -> int:
+            k = int(value)
+            if not 1 <= k <= 255:
+                raise argparse.ArgumentTypeError("must be between 1 and 255")
+            return k
+
+        parser.add_argument("--top-k", type=top_k_arg, default=LIBRARY_TOP_K)
+        parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--calorie-targets", action="store_true",
+                            help="also build every calorie-target bucket (about 40x the work)")
+        args = parser.parse_args(sys.argv[2:])
+        count = build_plan_library(args.output, args.top_k, args.jobs, args.calorie_targets)
+        print(f"Wrote {count} classes (version {library_version()}) to {args.output}")
+        sys.exit(0)
     if len(sys.argv) != 2:
         result = {"status": "error", "data": None, "error": "Usage: python workout_ai.py <user_id>"}
         print(json.dumps(result, cls=CustomEncoder))